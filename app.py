@@ -1,11 +1,14 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import plotly.express as px
 import plotly.graph_objects as go
 from io import BytesIO
 import traceback
+import hashlib
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 
 from data_processor import DataProcessor
 from kpi_calculator import KPICalculator
@@ -13,6 +16,206 @@ from gpt_client import GPTClient
 from validators import ExcelValidator
 from meta_client import MetaAdsClient
 
+
+class _UncachedResult(Exception):
+    """Raised inside a cached function to hand back a result without caching it."""
+
+    def __init__(self, result):
+        super().__init__()
+        self.result = result
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _validate_excel_cached(file_bytes: bytes):
+    """Validate the uploaded workbook once per distinct file content; reruns replay the result."""
+    validator = ExcelValidator()
+    return validator.validate_excel_file(BytesIO(file_bytes))
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _load_excel_cached(file_bytes: bytes):
+    """Parse the uploaded workbook once per distinct file content."""
+    processor = DataProcessor()
+    return processor.load_excel_data(BytesIO(file_bytes))
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _clean_cached(raw_df: pd.DataFrame):
+    """Clean and normalize a raw frame once per distinct input."""
+    processor = DataProcessor()
+    return processor.clean_and_normalize(raw_df)
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _calculate_kpis_cached(processed_df: pd.DataFrame):
+    """Calculate KPIs once per distinct cleaned frame; reruns replay the cached result and log."""
+    calculator = KPICalculator()
+    return calculator.calculate_all_kpis(processed_df)
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+def _bootstrap_cached(_meta_client, token_hash):
+    """
+    Validate the token and list ad accounts once per token every five minutes.
+
+    Every widget interaction reruns the script, so without this each rerun
+    would repeat the Graph API round trip before the account picker renders.
+    Only a valid token with its accounts is cached; a rejected token or a
+    transient error is handed back uncached, so re-entering the token retries.
+    """
+    result = _meta_client.bootstrap()
+    is_valid, _, accounts = result
+    if not (is_valid and accounts):
+        raise _UncachedResult(result)
+    return result
+
+
+def _bootstrap(meta_client, token_hash):
+    """Bootstrap the token through the cache, including uncached failed results."""
+    try:
+        return _bootstrap_cached(meta_client, token_hash)
+    except _UncachedResult as failed:
+        return failed.result
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def _get_insights_cached(_meta_client, account_id, start_date, end_date, token_hash):
+    """
+    Fetch insights for one account, cached per account and date range.
+
+    The client itself is excluded from hashing (leading underscore); the
+    token hash keeps results from different tokens apart without putting
+    the raw token in the cache key. Only complete fetches are cached: after
+    a failed request the rows are handed back uncached, so the next fetch
+    retries instead of replaying partial data and its error for an hour.
+    """
+    date_range = {'start_date': start_date, 'end_date': end_date}
+    data, complete = _meta_client.get_insights_data(account_id, date_range)
+    if not complete:
+        raise _UncachedResult(data)
+    return data
+
+
+def _get_insights(meta_client, account_id, start_date, end_date, token_hash):
+    """Fetch insights for one account through the cache, including uncached partial results."""
+    try:
+        return _get_insights_cached(meta_client, account_id, start_date, end_date, token_hash)
+    except _UncachedResult as incomplete:
+        return incomplete.result
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _kpis_to_excel_bytes(kpis: pd.DataFrame) -> bytes:
+    """
+    Build the KPI workbook once per KPI frame instead of on every rerun.
+    
+    xlsxwriter streams the sheet out far faster than openpyxl's object
+    model. Its constant_memory mode is not used because pandas writes
+    cells column by column, which that mode silently drops.
+    """
+    output = BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        kpis.to_excel(writer, sheet_name='KPIs', index=False)
+    return output.getvalue()
+
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def _kpis_to_csv_bytes(kpis: pd.DataFrame) -> bytes:
+    """
+    Encode the KPI frame as CSV once per KPI frame instead of on every rerun.
+    
+    pandas' writer is kept for the export format itself: plain dates and
+    minimal quoting, as users open the file in Excel or Sheets.
+    """
+    return kpis.to_csv(index=False).encode('utf-8')
+
+
+def _run_with_script_context(ctx, fn, *args):
+    """Run fn in a worker thread attached to the script run, so its st.* messages still render."""
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return fn(*args)
+
+
+def _sum_by_key(kpis: pd.DataFrame, key: str, columns) -> pd.DataFrame:
+    """
+    Sum columns per distinct value of key, sorted by key like groupby().sum().
+    
+    The key is factorized once and every column reuses the same codes with
+    np.bincount, rather than each groupby re-hashing the key. Rows with a
+    missing key are dropped, as groupby does.
+    """
+    codes, uniques = pd.factorize(kpis[key], sort=True)
+    valid = codes >= 0
+    codes = codes[valid]
+    
+    result = pd.DataFrame({key: uniques})
+    for col in columns:
+        weights = kpis[col].to_numpy(dtype=np.float64)[valid]
+        result[col] = np.bincount(codes, weights=weights, minlength=len(uniques))
+    return result
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _compute_overview(kpis: pd.DataFrame) -> dict:
+    """
+    Aggregate the KPI frame once for the overview metrics and charts.
+    
+    Streamlit reruns the whole script on every widget event, so the
+    scans and groupbys below are only repeated when the KPI data changes.
+    """
+    return {
+        'avg_cpc': kpis['cpc'].mean(),
+        'avg_cpm': kpis['cpm'].mean(),
+        'avg_ctr': kpis['ctr'].mean(),
+        'avg_cpa': kpis['cpa'].mean() if 'cpa' in kpis.columns else None,
+        'avg_roas': kpis['roas'].mean() if 'roas' in kpis.columns else None,
+        'avg_cvr': kpis['cvr'].mean() if 'cvr' in kpis.columns else None,
+        'daily_spend_df': _sum_by_key(kpis, 'date', ['spend']),
+        'campaign_perf_df': _sum_by_key(kpis, 'campaign_id', ['spend', 'clicks', 'impressions']),
+        'totals': {
+            'records': len(kpis),
+            'campaigns': kpis['campaign_id'].nunique(),
+            # Summed in float64 whatever the column dtype, so large accounts keep their cents
+            'spend': kpis['spend'].to_numpy().sum(dtype=np.float64),
+            # Reduce the datetime column first, then convert the two scalars
+            'date_start': kpis['date'].min().date(),
+            'date_end': kpis['date'].max().date()
+        }
+    }
+
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _build_overview_charts(kpis: pd.DataFrame):
+    """
+    Build the spend trend and campaign scatter figures once per KPI frame.
+    
+    Both use WebGL traces (Scattergl), which stay responsive with thousands
+    of campaigns or days where SVG rendering bogs down the browser.
+    """
+    overview = _compute_overview(kpis)
+    daily_spend = overview['daily_spend_df']
+    campaign_perf = overview['campaign_perf_df']
+    
+    spend_trend = go.Figure(go.Scattergl(
+        x=daily_spend['date'], y=daily_spend['spend'], mode='lines'
+    ))
+    spend_trend.update_layout(title="Daily Spend Trend", xaxis_title='date', yaxis_title='spend')
+    
+    # Area-scaled bubbles capped at 20px, matching plotly express' size= behaviour
+    max_impressions = max(float(campaign_perf['impressions'].max()), 1.0) if len(campaign_perf) else 1.0
+    campaign_scatter = go.Figure(go.Scattergl(
+        x=campaign_perf['spend'], y=campaign_perf['clicks'], mode='markers',
+        marker=dict(size=campaign_perf['impressions'], sizemode='area',
+                    sizeref=2.0 * max_impressions / (20 ** 2), sizemin=1),
+        text=campaign_perf['campaign_id'],
+        hovertemplate="campaign_id=%{text}<br>spend=%{x}<br>clicks=%{y}<extra></extra>"
+    ))
+    campaign_scatter.update_layout(title="Campaign Performance: Spend vs Clicks",
+                                   xaxis_title='spend', yaxis_title='clicks')
+    
+    return spend_trend, campaign_scatter
+
+
 def main():
     st.set_page_config(
         page_title="Ad Campaign Analyzer",
@@ -88,7 +291,10 @@ def main():
             try:
                 with st.spinner("Validating Meta access token..."):
                     meta_client = MetaAdsClient(meta_access_token)
-                    is_valid, message = meta_client.validate_token_and_permissions()
+                    token_hash = hashlib.sha256(meta_access_token.encode()).hexdigest()
+                    # Token check, permissions and ad accounts come back from one batch request,
+                    # replayed from the cache on reruns
+                    is_valid, message, accounts = _bootstrap(meta_client, token_hash)
                 
                 if not is_valid:
                     st.error(f"❌ Token validation failed: {message}")
@@ -97,10 +303,7 @@ def main():
                     
                     # Step 3: Select Ad Accounts
                     st.subheader("🏢 Step 3: Select Ad Accounts")
-                    
-                    with st.spinner("Fetching ad accounts..."):
-                        accounts = meta_client.get_ad_accounts()
-                        st.session_state.meta_accounts = accounts
+                    st.session_state.meta_accounts = accounts
                     
                     if accounts:
                         account_options = {f"{acc['name']} ({acc['id']})": acc['id'] for acc in accounts}
@@ -123,27 +326,38 @@ def main():
                                 # Step 4: Process Meta Data
                                 st.subheader("🔄 Step 4: Processing Meta Data")
                                 
-                                all_data = []
                                 date_range = {
                                     'start_date': start_date.strftime('%Y-%m-%d'),
                                     'end_date': end_date.strftime('%Y-%m-%d')
                                 }
                                 
-                                for account_display in selected_accounts:
-                                    account_id = account_options[account_display]
-                                    
-                                    with st.spinner(f"Fetching data from {account_display}..."):
-                                        account_data = meta_client.get_insights_data(account_id, date_range)
-                                        if not account_data.empty:
-                                            all_data.append(account_data)
+                                # Each account is an independent, I/O-bound Graph API fetch, so run them concurrently
+                                with st.spinner(f"Fetching data from {len(selected_accounts)} ad account(s)..."):
+                                    ctx = get_script_run_ctx()
+                                    results = {}
+                                    with ThreadPoolExecutor(max_workers=min(8, len(selected_accounts))) as executor:
+                                        futures = {
+                                            executor.submit(
+                                                _run_with_script_context, ctx, _get_insights,
+                                                meta_client, account_options[account_display],
+                                                date_range['start_date'], date_range['end_date'],
+                                                token_hash
+                                            ): account_display
+                                            for account_display in selected_accounts
+                                        }
+                                        for future in as_completed(futures):
+                                            results[futures[future]] = future.result()
+                                
+                                # Keep the selection order so duplicate resolution stays deterministic
+                                all_data = [results[account_display] for account_display in selected_accounts
+                                            if not results[account_display].empty]
                                 
                                 if all_data:
                                     # Combine all account data
                                     combined_data = pd.concat(all_data, ignore_index=True)
                                     
                                     # Process and clean the data
-                                    processor = DataProcessor()
-                                    processed_data = processor.clean_and_normalize(combined_data)
+                                    processed_data = _clean_cached(combined_data)
                                     st.session_state.processed_data = processed_data
                                     
                                     st.success(f"✅ Processed {len(processed_data)} records from Meta API")
@@ -176,9 +390,9 @@ def main():
                 # Step 2: Validate Excel file
                 st.subheader("📋 Step 2: Validate Input")
                 
+                file_bytes = uploaded_file.getvalue()
                 with st.spinner("Validating Excel file..."):
-                    validator = ExcelValidator()
-                    is_valid, validation_message = validator.validate_excel_file(uploaded_file)
+                    is_valid, validation_message = _validate_excel_cached(file_bytes)
                 
                 if not is_valid:
                     st.error(f"❌ Validation failed: {validation_message}")
@@ -189,9 +403,8 @@ def main():
                     st.subheader("🔄 Step 3: Load Data")
                     
                     with st.spinner("Processing campaign data..."):
-                        processor = DataProcessor()
-                        raw_data = processor.load_excel_data(uploaded_file)
-                        processed_data = processor.clean_and_normalize(raw_data)
+                        raw_data = _load_excel_cached(file_bytes)
+                        processed_data = _clean_cached(raw_data)
                         st.session_state.processed_data = processed_data
                     
                     st.success(f"✅ Processed {len(processed_data)} records")
@@ -210,9 +423,12 @@ def process_kpis_and_insights(processed_data, openai_api_key):
     st.subheader("📊 Step 4: Clean & Enrich")
     
     with st.spinner("Calculating KPIs..."):
-        calculator = KPICalculator()
-        kpis_data = calculator.calculate_all_kpis(processed_data)
+        kpis_data = _calculate_kpis_cached(processed_data)
         st.session_state.kpis = kpis_data
+        # The KPI step overwrites some cleaned columns (frequency), so the preview keeps the
+        # cleaned frame itself; the KPI frame is a shallow copy sharing its unchanged buffers
+        st.session_state.processed_data = processed_data
+        overview = _compute_overview(kpis_data)
     
     st.success("✅ KPIs calculated successfully")
     
@@ -239,13 +455,13 @@ def process_kpis_and_insights(processed_data, openai_api_key):
         # Summary metrics
         col_a, col_b, col_c, col_d = st.columns(4)
         with col_a:
-            st.metric("Total Records", len(data))
+            st.metric("Total Records", overview['totals']['records'])
         with col_b:
-            st.metric("Campaigns", data['campaign_id'].nunique())
+            st.metric("Campaigns", overview['totals']['campaigns'])
         with col_c:
-            st.metric("Date Range", f"{data['date'].dt.date.min()} to {data['date'].dt.date.max()}")
+            st.metric("Date Range", f"{overview['totals']['date_start']} to {overview['totals']['date_end']}")
         with col_d:
-            st.metric("Total Spend", f"${data['spend'].sum():,.2f}")
+            st.metric("Total Spend", f"${overview['totals']['spend']:,.2f}")
         
         # Data preview
         st.markdown("**Data Preview:**")
@@ -253,13 +469,10 @@ def process_kpis_and_insights(processed_data, openai_api_key):
         
         # JSON format display
         st.markdown("**Data in JSON Format:**")
-        import json
         
-        # Convert the first 5 rows to JSON for display
-        json_data = data.head(5).to_dict('records')
-        
-        # Display as formatted JSON
-        st.code(json.dumps(json_data, indent=2, default=str), language='json')
+        # Serialize the first 5 rows with pandas' C encoder; the browser renders the tree
+        json_data = data.head(5).to_json(orient='records', date_format='iso')
+        st.json(json_data, expanded=False)
     
     # KPIs Section
     if st.session_state.kpis is not None:
@@ -272,52 +485,38 @@ def process_kpis_and_insights(processed_data, openai_api_key):
         col1, col2, col3, col4, col5, col6 = st.columns(6)
         
         with col1:
-            avg_cpc = kpis['cpc'].mean()
-            st.metric("Avg CPC", f"${avg_cpc:.2f}")
+            st.metric("Avg CPC", f"${overview['avg_cpc']:.2f}")
         
         with col2:
-            avg_cpm = kpis['cpm'].mean()
-            st.metric("Avg CPM", f"${avg_cpm:.2f}")
+            st.metric("Avg CPM", f"${overview['avg_cpm']:.2f}")
         
         with col3:
-            avg_ctr = kpis['ctr'].mean() * 100
+            avg_ctr = overview['avg_ctr'] * 100
             st.metric("Avg CTR", f"{avg_ctr:.2f}%")
         
         with col4:
-            if 'cpa' in kpis.columns:
-                avg_cpa = kpis['cpa'].mean()
-                st.metric("Avg CPA", f"${avg_cpa:.2f}")
+            if overview['avg_cpa'] is not None:
+                st.metric("Avg CPA", f"${overview['avg_cpa']:.2f}")
         
         with col5:
-            if 'roas' in kpis.columns:
-                avg_roas = kpis['roas'].mean()
-                st.metric("Avg ROAS", f"{avg_roas:.2f}x")
+            if overview['avg_roas'] is not None:
+                st.metric("Avg ROAS", f"{overview['avg_roas']:.2f}x")
         
         with col6:
-            if 'cvr' in kpis.columns:
-                avg_cvr = kpis['cvr'].mean() * 100
+            if overview['avg_cvr'] is not None:
+                avg_cvr = overview['avg_cvr'] * 100
                 st.metric("Avg CVR", f"{avg_cvr:.2f}%")
         
         # Charts
         col1, col2 = st.columns(2)
+        fig1, fig2 = _build_overview_charts(kpis)
         
         with col1:
             # Spend over time
-            daily_spend = kpis.groupby('date')['spend'].sum().reset_index()
-            fig1 = px.line(daily_spend, x='date', y='spend', title="Daily Spend Trend")
             st.plotly_chart(fig1, use_container_width=True)
         
         with col2:
             # Performance by campaign
-            campaign_perf = kpis.groupby('campaign_id').agg({
-                'spend': 'sum',
-                'clicks': 'sum',
-                'impressions': 'sum'
-            }).reset_index()
-            
-            fig2 = px.scatter(campaign_perf, x='spend', y='clicks', 
-                            size='impressions', hover_data=['campaign_id'],
-                            title="Campaign Performance: Spend vs Clicks")
             st.plotly_chart(fig2, use_container_width=True)
         
         # Detailed KPIs table
@@ -352,23 +551,18 @@ def process_kpis_and_insights(processed_data, openai_api_key):
         
         with col1:
             # Export KPIs to Excel
-            output = BytesIO()
-            st.session_state.kpis.to_excel(output, engine='openpyxl', sheet_name='KPIs', index=False)
-            output.seek(0)
-            
             st.download_button(
                 label="📊 Download KPIs Excel",
-                data=output.getvalue(),
+                data=_kpis_to_excel_bytes(st.session_state.kpis),
                 file_name="campaign_kpis.xlsx",
                 mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
             )
         
         with col2:
             # Export KPIs to CSV
-            csv_data = st.session_state.kpis.to_csv(index=False)
             st.download_button(
                 label="📄 Download KPIs CSV",
-                data=csv_data,
+                data=_kpis_to_csv_bytes(st.session_state.kpis),
                 file_name="campaign_kpis.csv",
                 mime="text/csv"
             )
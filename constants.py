@@ -41,4 +41,51 @@ Overall Priority (High / Medium / Low)
 
 Can you always explain any abbreviations that exist. Like CTR, CPC etc
 
-Here is the campaign dataset:"""
\ No newline at end of file
+Here is the campaign dataset:"""
+
+# Campaigns (highest spend first) included in the GPT prompt payload
+GPT_TOP_N_CAMPAIGNS = 50
+
+# Relevance insight prompt, one template per section; conversion and revenue are only
+# included when the summary has them
+RELEVANCE_OVERVIEW_PROMPT = """
+        Analyze the following digital advertising campaign performance data and provide actionable insights:
+
+        CAMPAIGN OVERVIEW:
+        - Total Campaigns: {total_campaigns}
+        - Date Range: {date_range[start]} to {date_range[end]}
+        - Total Spend: ${total_spend:,.2f}
+        - Total Impressions: {total_impressions:,}
+        - Total Clicks: {total_clicks:,}
+
+        PERFORMANCE METRICS:
+        - Average CPC: ${avg_cpc:.2f}
+        - Average CPM: ${avg_cpm:.2f}
+        - Average CTR: {avg_ctr:.2%}
+        - Overall CTR: {overall_ctr:.2%}
+        """
+
+RELEVANCE_CONVERSION_PROMPT = """
+        CONVERSION METRICS:
+        - Total Purchases: {total_purchases:,}
+        - Average CPA: ${avg_cpa:.2f}
+        - Average CVR: {avg_cvr:.2%}
+            """
+
+RELEVANCE_REVENUE_PROMPT = """
+        REVENUE METRICS:
+        - Total Revenue: ${total_revenue:,.2f}
+        - Average ROAS: {avg_roas:.2f}x
+            """
+
+RELEVANCE_REQUEST_PROMPT = """
+        
+        Please provide:
+        1. Key Performance Insights (3-4 bullet points)
+        2. Areas of Concern (if any)
+        3. Optimization Recommendations (3-5 actionable suggestions)
+        4. Budget Allocation Suggestions
+        5. Overall Campaign Health Assessment
+        
+        Focus on practical, data-driven recommendations that can improve campaign performance.
+        """
@@ -3,9 +3,39 @@ import numpy as np
 from datetime import datetime, timedelta
 import streamlit as st
 
+# Derived frames share buffers with their parent until written to, so cleaning needs no defensive copy
+pd.set_option("mode.copy_on_write", True)
+
+def _downcast_count(values):
+    """
+    Store whole-number counts as int32, halving memory versus float64.
+    
+    int32 holds up to ~2.1B per row; a column with a larger value (or any
+    fractional value) keeps a wider dtype. Sums are still accumulated in
+    int64 by pandas, so totals do not overflow.
+    """
+    if not np.array_equal(values, np.trunc(values)):
+        return values
+    if values.max(initial=0) > np.iinfo(np.int32).max:
+        return values.astype(np.int64)
+    return values.astype(np.int32)
+
 class DataProcessor:
     """Handles data loading, cleaning, and normalization for campaign data."""
     
+    # Column groups sharing one conversion in _clean_data_types
+    AMOUNT_COLUMNS = ('spend', 'revenue')
+    COUNT_COLUMNS = ('impressions', 'clicks')
+    NUMERIC_COLUMNS = ('results', 'reach', 'frequency')
+    CATEGORY_COLUMNS = ('ad set budget', 'ad set budget type', 'campaign_delivery',
+                        'attribution setting', 'result_indicator')
+    LABEL_COLUMNS = ('account_id', 'campaign_id', 'ad_id', 'creative_id',
+                     'campaign_name', 'ad_name', 'objective')
+    
+    # Rows missing a required column are dropped; optional labels are filled with 'Unknown'
+    REQUIRED_COLUMNS = ('campaign_name', 'date')
+    UNKNOWN_FILL_COLUMNS = ('ad_name', 'objective')
+    
     def __init__(self):
         self.column_mapping = {
             # Map your Excel columns to our standard schema
@@ -28,6 +58,13 @@ class DataProcessor:
             'result indicator': 'result_indicator',
             'campaign delivery': 'campaign_delivery'
         }
+        
+        # Lowercased lookup for header renaming; it only renames, so headers that are not in it
+        # (including uploads already in the standard schema) pass through unchanged
+        self._column_mapping_lower = {k.lower(): v for k, v in self.column_mapping.items()}
+        
+        # Per-column conversion applied in a single pass by _clean_data_types
+        self.column_plan = self._build_column_plan()
     
     def load_excel_data(self, uploaded_file):
         """
@@ -40,8 +77,14 @@ class DataProcessor:
             pandas.DataFrame: Raw data from Excel
         """
         try:
-            # Read the Excel file
-            df = pd.read_excel(uploaded_file, sheet_name=0)
+            # Read the Excel file with the Rust calamine parser; every column is kept, since
+            # uploads in the standard schema and unmapped columns are carried through
+            try:
+                df = pd.read_excel(uploaded_file, sheet_name=0, engine='calamine')
+            except ImportError:
+                # python-calamine not installed; fall back to pandas' default reader
+                uploaded_file.seek(0)
+                df = pd.read_excel(uploaded_file, sheet_name=0)
             
             # Log basic info
             st.info(f"Loaded {len(df)} rows and {len(df.columns)} columns from Excel file")
@@ -62,29 +105,23 @@ class DataProcessor:
         Returns:
             pandas.DataFrame: Cleaned and normalized data
         """
-        # Create a copy to avoid modifying original
-        processed_df = df.copy()
-        
-        # Normalize column names
-        processed_df = self._normalize_column_names(processed_df)
-        
-        # Clean and convert data types
-        processed_df = self._clean_data_types(processed_df)
-        
-        # Handle missing values
-        processed_df = self._handle_missing_values(processed_df)
-        
-        # Remove duplicates
-        processed_df = self._remove_duplicates(processed_df)
-        
-        # Validate data consistency
-        processed_df = self._validate_data_consistency(processed_df)
-        
-        # Generate missing required fields
-        processed_df = self._generate_missing_fields(processed_df)
-        
-        # Sort by date and campaign
-        processed_df = processed_df.sort_values(['date', 'campaign_name']).reset_index(drop=True)
+        processed_df = (
+            df
+            # Normalize column names (returns a new frame, so the caller's df is never mutated)
+            .pipe(self._normalize_column_names)
+            # Clean and convert data types
+            .pipe(self._clean_data_types)
+            # Drop rows missing required fields and duplicates, sorted by date and campaign
+            .pipe(self._drop_incomplete_and_duplicate_rows)
+            # Handle missing values
+            .pipe(self._handle_missing_values)
+            # Validate data consistency
+            .pipe(self._validate_data_consistency)
+            # Generate missing required fields
+            .pipe(self._generate_missing_fields)
+            # Rows are already ordered by date and campaign from _drop_incomplete_and_duplicate_rows
+            .reset_index(drop=True)
+        )
         
         st.success(f"Data processing complete: {len(processed_df)} records ready for analysis")
         
@@ -93,108 +130,169 @@ class DataProcessor:
     def _normalize_column_names(self, df):
         """Normalize column names to standard format."""
         # Convert to lowercase and strip whitespace
-        df.columns = [col.lower().strip() for col in df.columns]
+        df = df.set_axis([col.lower().strip() for col in df.columns], axis=1)
         
         # Map to standard column names
-        column_mapping_lower = {k.lower(): v for k, v in self.column_mapping.items()}
-        df = df.rename(columns=column_mapping_lower)
+        df = df.rename(columns=self._column_mapping_lower)
         
         return df
     
-    def _clean_data_types(self, df):
-        """Clean and convert data types."""
-        # Convert date column
-        if 'date' in df.columns:
-            df['date'] = pd.to_datetime(df['date'], errors='coerce')
-        
-        # Convert numeric columns (including the new column names)
-        numeric_columns = ['spend', 'impressions', 'clicks', 'purchases', 'revenue', 'results', 'reach', 'frequency']
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')
-                # Replace negative values with 0 for metrics that can't be negative
-                if col in ['impressions', 'clicks']:
-                    df[col] = df[col].clip(lower=0)
-        
-        # Handle mixed data type columns that might cause Arrow conversion issues
-        string_columns = ['ad set budget', 'ad set budget type', 'campaign delivery', 'attribution setting', 'result indicator']
-        for col in string_columns:
-            if col in df.columns:
-                df[col] = df[col].astype(str)
-        
-        # Convert ID columns to string
-        id_columns = ['account_id', 'campaign_id', 'ad_id', 'creative_id']
-        for col in id_columns:
-            if col in df.columns:
-                df[col] = df[col].astype(str)
-        
-        return df
+    def _build_column_plan(self):
+        """Map each known column to the one conversion that fully cleans it."""
+        def to_datetime(series):
+            # calamine already returns real Excel date cells as datetimes; nothing to parse
+            if pd.api.types.is_datetime64_any_dtype(series):
+                return series
+            # Excel and Meta report ISO dates, which take pandas' fast fixed-format path
+            parsed = pd.to_datetime(series, format='%Y-%m-%d', errors='coerce', cache=True)
+            # Parse only the values that did not match element by element
+            fallback = parsed.isna() & series.notna()
+            if fallback.any():
+                parsed[fallback] = pd.to_datetime(series[fallback], format='mixed', errors='coerce')
+            return parsed
+        
+        def to_numeric(series):
+            return pd.to_numeric(series, errors='coerce')
+        
+        def to_amount(series):
+            # Missing amounts count as 0; amounts stay float64, since float32's ~7 significant
+            # digits would change the per-row values shown and exported (1271.18 -> 1271.1799774)
+            return to_numeric(series).fillna(0).astype(np.float64)
+        
+        def to_count(series):
+            # Missing counts become 0 and negatives are clipped, in one numpy kernel
+            return _downcast_count(np.maximum(to_numeric(series).fillna(0).to_numpy(), 0))
+        
+        def to_conversions(series):
+            # Missing conversions count as 0 (not clipped, unlike impressions/clicks)
+            return _downcast_count(to_numeric(series).fillna(0).to_numpy())
+        
+        def to_category(series):
+            # Stringify mixed values first so the categories stay homogeneous; missing values
+            # stay missing instead of becoming a literal 'nan' category
+            return series.astype(str).where(series.notna()).astype('category')
+        
+        def to_label(series):
+            # Names and IDs repeat across daily rows, so categorical codes replace per-row strings;
+            # missing values stay missing for the required-column drop and 'Unknown' fill
+            if isinstance(series.dtype, pd.CategoricalDtype) and series.cat.categories.inferred_type in ('string', 'empty'):
+                # Meta insights arrive already encoded with string categories
+                return series
+            return series.astype(str).where(series.notna()).astype('category')
+        
+        plan = {'date': to_datetime}
+        plan.update(dict.fromkeys(self.AMOUNT_COLUMNS, to_amount))
+        plan.update(dict.fromkeys(self.COUNT_COLUMNS, to_count))
+        plan['purchases'] = to_conversions
+        plan.update(dict.fromkeys(self.NUMERIC_COLUMNS, to_numeric))
+        # Low-cardinality descriptive columns are dictionary-encoded
+        plan.update(dict.fromkeys(self.CATEGORY_COLUMNS, to_category))
+        plan.update(dict.fromkeys(self.LABEL_COLUMNS, to_label))
+        return plan
     
-    def _handle_missing_values(self, df):
-        """Handle missing values in the dataset."""
-        # Fill numeric columns with 0
-        numeric_columns = ['spend', 'impressions', 'clicks', 'purchases', 'revenue']
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = df[col].fillna(0)
-        
-        # Remove rows where required columns are missing
-        required_columns = ['campaign_name', 'date']
-        for col in required_columns:
-            if col in df.columns:
-                df = df.dropna(subset=[col])
-        
-        # Fill optional string columns with 'Unknown'
-        string_columns = ['ad_name', 'campaign_name', 'objective']
-        for col in string_columns:
-            if col in df.columns:
-                df[col] = df[col].fillna('Unknown')
+    def _clean_data_types(self, df):
+        """Clean and convert data types, filling and clipping numeric metrics in the same pass."""
+        for col in df.columns:
+            convert = self.column_plan.get(col)
+            if convert is not None:
+                df[col] = convert(df[col])
         
         return df
     
-    def _remove_duplicates(self, df):
-        """Remove duplicate rows."""
-        initial_count = len(df)
+    def _drop_incomplete_and_duplicate_rows(self, df):
+        """Sort rows by date and campaign, dropping rows missing required fields and duplicate rows."""
+        complete = df[list(self.REQUIRED_COLUMNS)].notna().all(axis=1).to_numpy()
         
         # Define columns for duplicate detection
-        duplicate_cols = ['campaign_name', 'date']
+        duplicate_cols = ['date', 'campaign_name']
         if 'ad_id' in df.columns:
             duplicate_cols.append('ad_id')
         
-        # Remove duplicates, keeping the first occurrence
-        df = df.drop_duplicates(subset=duplicate_cols, keep='first')
+        # Integer keys that sort like the column; missing values share one key, so they
+        # match each other like in drop_duplicates
+        keys = []
+        for col in duplicate_cols:
+            if isinstance(df[col].dtype, pd.CategoricalDtype):
+                keys.append(df[col].cat.codes.to_numpy())
+            elif pd.api.types.is_datetime64_dtype(df[col]):
+                # Timestamps already are int64 nanoseconds, so they sort without hashing
+                keys.append(df[col].to_numpy().view(np.int64))
+            else:
+                keys.append(pd.factorize(df[col], sort=True)[0])
+        
+        # A stable lexsort puts every duplicate right after its first occurrence (np.lexsort
+        # takes the primary key last), so one adjacent-key comparison finds them all
+        order = np.lexsort(keys[::-1])
+        same_as_previous = np.ones(max(len(df) - 1, 0), dtype=bool)
+        for key in keys:
+            sorted_key = key[order]
+            same_as_previous &= sorted_key[1:] == sorted_key[:-1]
+        first_occurrence = np.empty(len(df), dtype=bool)
+        first_occurrence[order[:1]] = True
+        first_occurrence[order[1:]] = ~same_as_previous
+        
+        # Both filters are combined into one mask. Rows are ordered by date and campaign only,
+        # ties keeping their upload order, so ad_id (a duplicate key) does not reorder them
+        keep = complete & first_occurrence
+        removed_count = np.count_nonzero(complete & ~first_occurrence)
+        if len(keys) > 2:
+            order = np.lexsort(keys[1::-1])
+        df = df.take(order[keep[order]])
         
-        removed_count = initial_count - len(df)
         if removed_count > 0:
             st.warning(f"Removed {removed_count} duplicate rows")
         
         return df
     
+    def _handle_missing_values(self, df):
+        """Fill missing optional values (numeric metrics are zero-filled in _clean_data_types)."""
+        # Fill optional string columns with 'Unknown', all in one fillna call
+        fill_values = {col: 'Unknown' for col in self.UNKNOWN_FILL_COLUMNS
+                       if col in df.columns and df[col].hasnans}
+        if fill_values:
+            # Categorical labels only accept fill values that are already categories
+            df = df.assign(**{col: df[col].cat.add_categories('Unknown') for col in fill_values
+                              if isinstance(df[col].dtype, pd.CategoricalDtype)
+                              and 'Unknown' not in df[col].cat.categories})
+            df = df.fillna(fill_values)
+        
+        return df
+    
     def _validate_data_consistency(self, df):
         """Validate and fix data consistency issues."""
         # Fix impossible relationships (clicks > impressions)
+        # Fixes are applied in place on writable copies of the metric arrays and each column is
+        # written back once, so no intermediate Series or result arrays are allocated
         if 'clicks' in df.columns and 'impressions' in df.columns:
-            invalid_mask = df['clicks'] > df['impressions']
-            invalid_count = invalid_mask.sum()
+            clicks = df['clicks'].to_numpy(copy=True)
+            impressions = df['impressions'].to_numpy()
+            invalid_count = np.count_nonzero(clicks > impressions)
             
             if invalid_count > 0:
                 st.warning(f"Found {invalid_count} rows where clicks > impressions. Setting clicks = impressions for these rows.")
-                df.loc[invalid_mask, 'clicks'] = df.loc[invalid_mask, 'impressions']
+                # Branchless clamp; the minimum never exceeds clicks, so it fits clicks' dtype
+                np.minimum(clicks, impressions, out=clicks, casting='unsafe')
+                df['clicks'] = clicks
         
         # Fix negative spend (should not happen after earlier cleaning, but just in case)
         if 'spend' in df.columns:
-            negative_spend = (df['spend'] < 0).sum()
+            spend = df['spend'].to_numpy(copy=True)
+            negative_spend = np.count_nonzero(spend < 0)
             if negative_spend > 0:
                 st.warning(f"Found {negative_spend} rows with negative spend. Setting to 0.")
-                df['spend'] = df['spend'].clip(lower=0)
+                np.maximum(spend, 0, out=spend)
+                df['spend'] = spend
         
         # Validate purchases vs revenue relationship
         if 'purchases' in df.columns and 'revenue' in df.columns:
             # If there's revenue but no purchases, set purchases to 1
-            mask = (df['revenue'] > 0) & (df['purchases'] == 0)
-            if mask.any():
-                df.loc[mask, 'purchases'] = 1
-                st.info(f"Set purchases = 1 for {mask.sum()} rows with revenue but no purchases")
+            purchases = df['purchases'].to_numpy(copy=True)
+            mask = (df['revenue'].to_numpy() > 0) & (purchases == 0)
+            fixed_count = np.count_nonzero(mask)
+            if fixed_count > 0:
+                np.putmask(purchases, mask, 1)
+                df['purchases'] = purchases
+                st.info(f"Set purchases = 1 for {fixed_count} rows with revenue but no purchases")
         
         return df
     
@@ -202,12 +300,18 @@ class DataProcessor:
         """Generate missing required fields from available data."""
         # Generate account_id (since your data doesn't have it, we'll create a default one)
         if 'account_id' not in df.columns:
-            df['account_id'] = 'desky_account_001'
+            df['account_id'] = pd.Categorical.from_codes(np.zeros(len(df), dtype=np.int8), ['desky_account_001'])
+        
+        # Row labels as a fixed-width string array, shared by the generated IDs below
+        row_labels = df.index.to_numpy().astype(str)
         
         # Generate campaign_id from campaign_name
         if 'campaign_id' not in df.columns and 'campaign_name' in df.columns:
-            # Create simple ID from campaign name
-            df['campaign_id'] = df['campaign_name'].str.replace(' ', '_').str.lower() + '_' + df.index.astype(str)
+            # Create simple ID from campaign name; the string ops run once per category
+            names = df['campaign_name'].cat
+            slugs = names.categories.str.replace(' ', '_').str.lower().to_numpy(dtype=str)
+            base = slugs[names.codes.to_numpy()]
+            df['campaign_id'] = np.char.add(np.char.add(base, '_'), row_labels)
         
         # Ensure we have purchases column (map from Results if available)
         if 'purchases' not in df.columns:
@@ -222,10 +326,11 @@ class DataProcessor:
         
         # Add other standard fields if missing
         if 'ad_id' not in df.columns:
-            df['ad_id'] = df['campaign_id'] + '_ad_' + df.index.astype(str)
+            campaign_ids = df['campaign_id'].to_numpy(dtype=str)
+            df['ad_id'] = np.char.add(campaign_ids, np.char.add('_ad_', row_labels))
         
         if 'ad_name' not in df.columns:
-            df['ad_name'] = df['campaign_name'] + ' - Ad'
+            df['ad_name'] = df['campaign_name'].cat.rename_categories(lambda name: f"{name} - Ad")
             
         return df
     
@@ -239,19 +344,27 @@ class DataProcessor:
         Returns:
             dict: Summary statistics
         """
+        # Reduce each group of columns with one call, then index into the results
+        dates = df['date'].agg(['min', 'max']) if 'date' in df.columns else None
+        distinct = df[[col for col in ('campaign_id', 'account_id') if col in df.columns]].nunique()
+        counts = df[[col for col in ('impressions', 'clicks', 'purchases') if col in df.columns]].sum()
+        # Amounts are totalled in float64 whatever dtype they arrive in, so large sums keep their cents
+        amounts = {col: df[col].to_numpy().sum(dtype=np.float64)
+                   for col in ('spend', 'revenue') if col in df.columns}
+        
         summary = {
             'total_rows': len(df),
             'date_range': {
-                'start': df['date'].min().strftime('%Y-%m-%d') if 'date' in df.columns else None,
-                'end': df['date'].max().strftime('%Y-%m-%d') if 'date' in df.columns else None
+                'start': dates['min'].strftime('%Y-%m-%d') if dates is not None else None,
+                'end': dates['max'].strftime('%Y-%m-%d') if dates is not None else None
             },
-            'campaigns': df['campaign_id'].nunique() if 'campaign_id' in df.columns else 0,
-            'accounts': df['account_id'].nunique() if 'account_id' in df.columns else 0,
-            'total_spend': df['spend'].sum() if 'spend' in df.columns else 0,
-            'total_impressions': df['impressions'].sum() if 'impressions' in df.columns else 0,
-            'total_clicks': df['clicks'].sum() if 'clicks' in df.columns else 0,
-            'total_purchases': df['purchases'].sum() if 'purchases' in df.columns else 0,
-            'total_revenue': df['revenue'].sum() if 'revenue' in df.columns else 0
+            'campaigns': distinct.get('campaign_id', 0),
+            'accounts': distinct.get('account_id', 0),
+            'total_spend': amounts.get('spend', 0),
+            'total_impressions': counts.get('impressions', 0),
+            'total_clicks': counts.get('clicks', 0),
+            'total_purchases': counts.get('purchases', 0),
+            'total_revenue': amounts.get('revenue', 0)
         }
         
         return summary
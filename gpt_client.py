@@ -1,8 +1,8 @@
-import json
 import os
 import streamlit as st
 from openai import OpenAI
-from constants import GPT_PROMPT
+from constants import GPT_PROMPT, GPT_TOP_N_CAMPAIGNS
+from kpi_calculator import KPICalculator
 
 
 class GPTClient:
@@ -25,19 +25,21 @@ class GPTClient:
         Returns:
             str: AI-generated insights text
         """
+        prompt_data = None
         try:
-            # Convert DataFrame to JSON format
-            json_data = kpi_data.to_dict('records')
+            # Serialize the campaign aggregates straight to JSON records, once for both the prompt
+            # and the debug print
+            prompt_data = self._aggregate_for_prompt(kpi_data)
+            json_payload = prompt_data.to_json(orient='records', indent=2, date_format='iso')
 
             # Construct the full prompt with data
-            full_prompt = GPT_PROMPT + "\n\n" + json.dumps(
-                json_data, indent=2, default=str)
+            full_prompt = GPT_PROMPT + "\n\n" + json_payload
 
             # Print the data being sent to GPT (for debugging)
             print("=" * 50)
             print("DATA BEING SENT TO GPT API:")
             print("=" * 50)
-            print(json.dumps(json_data, indent=2, default=str))
+            print(json_payload)
             print("=" * 50)
 
             # Call GPT API
@@ -61,17 +63,30 @@ class GPTClient:
 
         except Exception as e:
             st.error(f"Error generating GPT insights: {str(e)}")
-            return self._generate_fallback_insights(kpi_data)
+            # Reuse the aggregates if they were built before the failure
+            return self._generate_fallback_insights(kpi_data, prompt_data)
 
-    def _generate_fallback_insights(self, df):
+    def _aggregate_for_prompt(self, kpi_data):
+        """
+        Reduce row-level KPIs to one record per campaign for the prompt.
+        
+        The prompt asks for a per-campaign analysis, so daily rows only add
+        tokens; the payload is capped at the top campaigns by spend.
+        """
+        # Group by name: generated campaign IDs are unique per row for Excel uploads
+        campaign_summary = KPICalculator().get_campaign_summary(kpi_data, by='campaign_name')
+        return campaign_summary.nlargest(GPT_TOP_N_CAMPAIGNS, 'spend')
+
+    def _generate_fallback_insights(self, df, prompt_data=None):
         """Generate basic insights when GPT API is unavailable."""
-        # Still print the JSON data even when using fallback
-        json_data = df.to_dict('records')
-        print("=" * 50)
-        print("JSON DATA THAT WOULD BE SENT TO GPT API (using fallback):")
-        print("=" * 50)
-        print(json.dumps(json_data, indent=2, default=str))
-        print("=" * 50)
+        # Still print the JSON data even when using fallback; if building it was what failed,
+        # it is not attempted again here
+        if prompt_data is not None:
+            print("=" * 50)
+            print("JSON DATA THAT WOULD BE SENT TO GPT API (using fallback):")
+            print("=" * 50)
+            print(prompt_data.to_json(orient='records', indent=2, date_format='iso'))
+            print("=" * 50)
 
         return self._generate_basic_insights(df)
 
@@ -90,7 +105,7 @@ class GPTClient:
         insights.append(
             f"- **Date Range:** {df['date'].min().date()} to {df['date'].max().date()}"
         )
-        insights.append(f"- **Total Spend:** ₹{df['spend'].sum():,.2f}")
+        insights.append(f"- **Total Spend:** ₹{df['spend'].to_numpy().sum(dtype='float64'):,.2f}")
         insights.append(
             f"- **Total Impressions:** {df['impressions'].sum():,}")
         insights.append(f"- **Total Clicks:** {df['clicks'].sum():,}")
@@ -128,7 +143,8 @@ class GPTClient:
 
         # Top Campaigns
         insights.append("## Top Performing Campaigns by Spend")
-        top_campaigns = df.groupby('campaign_name')['spend'].sum().nlargest(5)
+        # nlargest orders the result itself, so the group keys need no sorting
+        top_campaigns = df.groupby('campaign_name', observed=True, sort=False)['spend'].sum().nlargest(5)
         for i, (campaign, spend) in enumerate(top_campaigns.items(), 1):
             insights.append(f"{i}. **{campaign}**: ₹{spend:,.2f}")
 
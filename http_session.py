@@ -0,0 +1,50 @@
+import http.cookiejar
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.request import ACCEPT_ENCODING
+from urllib3.util.retry import Retry
+
+# Graph API requests a single client may have in flight at once, across all of its accounts'
+# concurrent insights windows; more mostly earns 429s that the retries then have to absorb
+GRAPH_MAX_CONCURRENCY = 8
+
+# Keep-alive connections per host, room for a few clients fetching at the same time
+POOL_MAXSIZE = 32
+
+
+def _build_session(allowed_methods: frozenset) -> requests.Session:
+    """
+    Build a pooled, retrying session.
+
+    Transient 429/5xx responses to `allowed_methods` are retried with
+    exponential backoff (honouring Retry-After) on the already-open
+    connection, so one throttled page no longer aborts a long paginated
+    fetch. After the last retry the error response is returned as-is for the
+    callers' status-code checks. Connection errors are retried for any
+    method, since the request never reached the server.
+    """
+    retry = Retry(
+        total=5,
+        backoff_factor=0.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=allowed_methods,
+        respect_retry_after_header=True,
+        raise_on_status=False
+    )
+
+    session = requests.Session()
+    session.mount("https://", HTTPAdapter(pool_connections=16, pool_maxsize=POOL_MAXSIZE, max_retries=retry))
+    # Ask for every content encoding urllib3 can decode: gzip and deflate, plus br/zstd
+    # when brotli/zstandard are installed. Insights JSON compresses roughly tenfold
+    session.headers["Accept-Encoding"] = ACCEPT_ENCODING
+    # The session serves every app user; auth travels with each request, never in cookies
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    return session
+
+
+# Graph API: the only POST is the read-only token bootstrap batch, which is safe to repeat
+GRAPH_SESSION = _build_session(Retry.DEFAULT_ALLOWED_METHODS | {"POST"})
+
+# Relevance: the completion POST is a billed, non-idempotent generation, so it is never
+# retried once sent
+RELEVANCE_SESSION = _build_session(Retry.DEFAULT_ALLOWED_METHODS)
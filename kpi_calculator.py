@@ -2,6 +2,23 @@ import pandas as pd
 import numpy as np
 import streamlit as st
 
+def _safe_div(numerator, denominator, positive=None):
+    """
+    Divide element-wise, giving 0 wherever the denominator is not positive.
+    
+    The division only runs on the valid lanes and writes straight into a
+    zero-initialized float64 result, so no divide-by-zero warnings are raised
+    and no masked fallback array is built. KPIs are shown and exported, so
+    they keep float64 precision instead of float32 noise (1.2300000190734863). positive is the precomputed
+    denominator > 0 mask, when the caller shares one across several KPIs.
+    """
+    numerator = np.asarray(numerator)
+    denominator = np.asarray(denominator)
+    if positive is None:
+        positive = denominator > 0
+    return np.divide(numerator, denominator, out=np.zeros(len(numerator), dtype=np.float64),
+                     where=positive)
+
 class KPICalculator:
     """Calculates marketing KPIs from campaign data."""
     
@@ -26,142 +43,109 @@ class KPICalculator:
         Returns:
             pandas.DataFrame: DataFrame with original data plus calculated KPIs
         """
-        # Create a copy to avoid modifying original data
-        kpi_df = df.copy()
+        # KPIs are only ever added as new columns, so a shallow copy is enough to leave the
+        # caller's frame untouched; the existing column buffers are shared, not duplicated
+        kpi_df = self._add_kpi_columns(df.copy(deep=False))
+        
+        # Log summary
+        self._log_kpi_summary(kpi_df)
+        
+        return kpi_df
+    
+    def _add_kpi_columns(self, kpi_df):
+        """Write every available KPI column into kpi_df, which the caller owns."""
+        # Each denominator's "> 0" mask is built once and shared by every KPI dividing by it
+        positive = {col: kpi_df[col].to_numpy() > 0
+                    for col in ('spend', 'impressions', 'clicks', 'purchases') if col in kpi_df.columns}
         
         # Calculate basic KPIs
-        kpi_df = self._calculate_cpc(kpi_df)
-        kpi_df = self._calculate_cpm(kpi_df)
-        kpi_df = self._calculate_ctr(kpi_df)
+        kpi_df = self._calculate_cpc(kpi_df, positive)
+        kpi_df = self._calculate_cpm(kpi_df, positive)
+        kpi_df = self._calculate_ctr(kpi_df, positive)
         
         # Calculate conversion KPIs if purchase data is available
         if 'purchases' in kpi_df.columns:
-            kpi_df = self._calculate_cpa(kpi_df)
-            kpi_df = self._calculate_cvr(kpi_df)
+            kpi_df = self._calculate_cpa(kpi_df, positive)
+            kpi_df = self._calculate_cvr(kpi_df, positive)
         
         # Calculate ROAS if revenue data is available
         if 'revenue' in kpi_df.columns:
-            kpi_df = self._calculate_roas(kpi_df)
+            kpi_df = self._calculate_roas(kpi_df, positive)
         
         # Calculate frequency if possible (simplified version)
-        kpi_df = self._calculate_frequency(kpi_df)
+        kpi_df = self._calculate_frequency(kpi_df, positive)
         
         # Add derived metrics
-        kpi_df = self._calculate_derived_metrics(kpi_df)
-        
-        # Log summary
-        self._log_kpi_summary(kpi_df)
+        kpi_df = self._calculate_derived_metrics(kpi_df, positive)
         
         return kpi_df
     
-    def _calculate_cpc(self, df):
+    def _calculate_cpc(self, df, positive):
         """Calculate Cost Per Click."""
-        df['cpc'] = np.where(
-            df['clicks'] > 0,
-            df['spend'] / df['clicks'],
-            0
-        )
+        df['cpc'] = _safe_div(df['spend'], df['clicks'], positive['clicks'])
         return df
     
-    def _calculate_cpm(self, df):
+    def _calculate_cpm(self, df, positive):
         """Calculate Cost Per Mille (1000 impressions)."""
-        df['cpm'] = np.where(
-            df['impressions'] > 0,
-            (df['spend'] / df['impressions']) * 1000,
-            0
-        )
+        cpm = _safe_div(df['spend'], df['impressions'], positive['impressions'])
+        cpm *= 1000
+        df['cpm'] = cpm
         return df
     
-    def _calculate_ctr(self, df):
+    def _calculate_ctr(self, df, positive):
         """Calculate Click Through Rate."""
-        df['ctr'] = np.where(
-            df['impressions'] > 0,
-            df['clicks'] / df['impressions'],
-            0
-        )
+        df['ctr'] = _safe_div(df['clicks'], df['impressions'], positive['impressions'])
         return df
     
-    def _calculate_cpa(self, df):
+    def _calculate_cpa(self, df, positive):
         """Calculate Cost Per Acquisition."""
         if 'purchases' in df.columns:
-            df['cpa'] = np.where(
-                df['purchases'] > 0,
-                df['spend'] / df['purchases'],
-                0
-            )
+            df['cpa'] = _safe_div(df['spend'], df['purchases'], positive['purchases'])
         return df
     
-    def _calculate_roas(self, df):
+    def _calculate_roas(self, df, positive):
         """Calculate Return On Ad Spend."""
         if 'revenue' in df.columns:
-            df['roas'] = np.where(
-                df['spend'] > 0,
-                df['revenue'] / df['spend'],
-                0
-            )
+            df['roas'] = _safe_div(df['revenue'], df['spend'], positive['spend'])
         return df
     
-    def _calculate_cvr(self, df):
+    def _calculate_cvr(self, df, positive):
         """Calculate Conversion Rate."""
         if 'purchases' in df.columns:
-            df['cvr'] = np.where(
-                df['clicks'] > 0,
-                df['purchases'] / df['clicks'],
-                0
-            )
+            df['cvr'] = _safe_div(df['purchases'], df['clicks'], positive['clicks'])
         return df
     
-    def _calculate_frequency(self, df):
+    def _calculate_frequency(self, df, positive):
         """Calculate simplified frequency metric."""
         # Simplified frequency calculation: impressions / unique users
         # Since we don't have unique users, we'll use a proxy based on impressions/clicks ratio
-        df['frequency'] = np.where(
-            df['clicks'] > 0,
-            df['impressions'] / df['clicks'],
-            df['impressions'] / 1  # Fallback when no clicks
-        )
+        # Rows with no clicks keep the raw impressions as the fallback value
+        impressions = df['impressions'].to_numpy()
+        clicks = df['clicks'].to_numpy()
+        df['frequency'] = np.divide(impressions, clicks, out=impressions.astype(np.float64),
+                                    where=positive['clicks'])
         return df
     
-    def _calculate_derived_metrics(self, df):
+    def _calculate_derived_metrics(self, df, positive):
         """Calculate additional derived metrics."""
         # Cost per impression
-        df['cost_per_impression'] = np.where(
-            df['impressions'] > 0,
-            df['spend'] / df['impressions'],
-            0
-        )
+        df['cost_per_impression'] = _safe_div(df['spend'], df['impressions'], positive['impressions'])
         
         # Revenue per impression (if revenue available)
         if 'revenue' in df.columns:
-            df['revenue_per_impression'] = np.where(
-                df['impressions'] > 0,
-                df['revenue'] / df['impressions'],
-                0
-            )
+            df['revenue_per_impression'] = _safe_div(df['revenue'], df['impressions'], positive['impressions'])
         
         # Revenue per click (if revenue available)
         if 'revenue' in df.columns:
-            df['revenue_per_click'] = np.where(
-                df['clicks'] > 0,
-                df['revenue'] / df['clicks'],
-                0
-            )
+            df['revenue_per_click'] = _safe_div(df['revenue'], df['clicks'], positive['clicks'])
         
         # Purchase rate (purchases per impression)
         if 'purchases' in df.columns:
-            df['purchase_rate'] = np.where(
-                df['impressions'] > 0,
-                df['purchases'] / df['impressions'],
-                0
-            )
+            df['purchase_rate'] = _safe_div(df['purchases'], df['impressions'], positive['impressions'])
         
         # Average order value (if both revenue and purchases available)
         if 'revenue' in df.columns and 'purchases' in df.columns:
-            df['aov'] = np.where(
-                df['purchases'] > 0,
-                df['revenue'] / df['purchases'],
-                0
-            )
+            df['aov'] = _safe_div(df['revenue'], df['purchases'], positive['purchases'])
         
         return df
     
@@ -169,64 +153,74 @@ class KPICalculator:
         """Log summary of calculated KPIs."""
         st.info("KPI Calculation Summary:")
         
+        # Cost and return averages skip zero rows; all are masked and averaged in one call
+        # on the KPI columns alone, instead of filtering the whole frame once per metric
+        cost_kpis = [col for col in ('cpc', 'cpm', 'cpa', 'roas') if col in df.columns]
+        avg = df[cost_kpis].where(lambda kpis: kpis > 0).mean()
+        avg = pd.concat([avg, df[[col for col in ('ctr', 'cvr') if col in df.columns]].mean()])
+        
         # Basic metrics summary
-        if 'cpc' in df.columns:
-            avg_cpc = df[df['cpc'] > 0]['cpc'].mean()
-            st.write(f"• Average CPC: ${avg_cpc:.2f}")
+        if 'cpc' in avg:
+            st.write(f"• Average CPC: ${avg['cpc']:.2f}")
         
-        if 'cpm' in df.columns:
-            avg_cpm = df[df['cpm'] > 0]['cpm'].mean()
-            st.write(f"• Average CPM: ${avg_cpm:.2f}")
+        if 'cpm' in avg:
+            st.write(f"• Average CPM: ${avg['cpm']:.2f}")
         
-        if 'ctr' in df.columns:
-            avg_ctr = df['ctr'].mean() * 100
-            st.write(f"• Average CTR: {avg_ctr:.2f}%")
+        if 'ctr' in avg:
+            st.write(f"• Average CTR: {avg['ctr'] * 100:.2f}%")
         
-        if 'cpa' in df.columns:
-            avg_cpa = df[df['cpa'] > 0]['cpa'].mean()
-            st.write(f"• Average CPA: ${avg_cpa:.2f}")
+        if 'cpa' in avg:
+            st.write(f"• Average CPA: ${avg['cpa']:.2f}")
         
-        if 'roas' in df.columns:
-            avg_roas = df[df['roas'] > 0]['roas'].mean()
-            st.write(f"• Average ROAS: {avg_roas:.2f}x")
+        if 'roas' in avg:
+            st.write(f"• Average ROAS: {avg['roas']:.2f}x")
         
-        if 'cvr' in df.columns:
-            avg_cvr = df['cvr'].mean() * 100
-            st.write(f"• Average CVR: {avg_cvr:.2f}%")
+        if 'cvr' in avg:
+            st.write(f"• Average CVR: {avg['cvr'] * 100:.2f}%")
     
-    def get_campaign_summary(self, df):
+    def get_campaign_summary(self, df, by='campaign_id'):
         """
         Get aggregated KPIs by campaign.
         
         Args:
             df: DataFrame with calculated KPIs
+            by: Column identifying a campaign ('campaign_id' or 'campaign_name')
             
         Returns:
             pandas.DataFrame: Campaign-level KPI summary
         """
-        # Aggregate by campaign
-        agg_dict = {
-            'spend': 'sum',
-            'impressions': 'sum',
-            'clicks': 'sum',
-            'date': ['min', 'max']
+        # Aggregate by campaign with named outputs, so no column flattening is needed
+        aggregations = {
+            'spend': ('spend', 'sum'),
+            'impressions': ('impressions', 'sum'),
+            'clicks': ('clicks', 'sum'),
+            'date_min': ('date', 'min'),
+            'date_max': ('date', 'max')
         }
         
         # Add purchases and revenue if available
         if 'purchases' in df.columns:
-            agg_dict['purchases'] = 'sum'
+            aggregations['purchases'] = ('purchases', 'sum')
         if 'revenue' in df.columns:
-            agg_dict['revenue'] = 'sum'
-        
-        campaign_summary = df.groupby('campaign_id').agg(agg_dict).reset_index()
-        
-        # Flatten column names
-        campaign_summary.columns = ['_'.join(col).strip('_') if col[1] else col[0] 
-                                  for col in campaign_summary.columns]
-        
-        # Recalculate KPIs at campaign level
-        calculator = KPICalculator()
-        campaign_summary = calculator.calculate_all_kpis(campaign_summary)
+            aggregations['revenue'] = ('revenue', 'sum')
+        # Daily reach is summed, so a campaign's reach counts a person once per day reached
+        if 'reach' in df.columns:
+            aggregations['reach'] = ('reach', 'sum')
+        # Keep the readable name alongside an ID key
+        if by != 'campaign_name' and 'campaign_name' in df.columns:
+            aggregations['campaign_name'] = ('campaign_name', 'first')
+        
+        # Campaign order carries no meaning, so the group keys are left unsorted
+        campaign_summary = df.groupby(by, observed=True, sort=False,
+                                      as_index=False).agg(**aggregations)
+        
+        # Recalculate KPIs at campaign level on the freshly built aggregate
+        campaign_summary = self._add_kpi_columns(campaign_summary)
+        
+        # With reach available, frequency is impressions per person reached rather than the
+        # impressions/clicks proxy
+        if 'reach' in campaign_summary.columns:
+            campaign_summary['frequency'] = _safe_div(campaign_summary['impressions'], campaign_summary['reach'])
         
         return campaign_summary
     
@@ -241,26 +235,21 @@ class KPICalculator:
             pandas.DataFrame: Daily KPI summary
         """
         # Aggregate by date
-        agg_dict = {
-            'spend': 'sum',
-            'impressions': 'sum',
-            'clicks': 'sum',
-            'campaign_id': 'nunique'
+        aggregations = {
+            'spend': ('spend', 'sum'),
+            'impressions': ('impressions', 'sum'),
+            'clicks': ('clicks', 'sum'),
+            'active_campaigns': ('campaign_id', 'nunique')
         }
         
         # Add purchases and revenue if available
         if 'purchases' in df.columns:
-            agg_dict['purchases'] = 'sum'
+            aggregations['purchases'] = ('purchases', 'sum')
         if 'revenue' in df.columns:
-            agg_dict['revenue'] = 'sum'
-        
-        date_summary = df.groupby('date').agg(agg_dict).reset_index()
-        
-        # Recalculate KPIs at daily level
-        calculator = KPICalculator()
-        date_summary = calculator.calculate_all_kpis(date_summary)
+            aggregations['revenue'] = ('revenue', 'sum')
         
-        # Rename campaign count column
-        date_summary = date_summary.rename(columns={'campaign_id': 'active_campaigns'})
+        # Days stay in calendar order; only the distinct dates are sorted, not the rows
+        date_summary = df.groupby('date', as_index=False).agg(**aggregations)
         
-        return date_summary
+        # Recalculate KPIs at daily level on the freshly built aggregate
+        return self._add_kpi_columns(date_summary)
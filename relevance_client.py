@@ -1,9 +1,13 @@
-import requests
 import json
+import numpy as np
 import pandas as pd
 import streamlit as st
 import os
 
+from constants import (RELEVANCE_OVERVIEW_PROMPT, RELEVANCE_CONVERSION_PROMPT,
+                       RELEVANCE_REVENUE_PROMPT, RELEVANCE_REQUEST_PROMPT)
+from http_session import RELEVANCE_SESSION
+
 class RelevanceClient:
     """Client for interacting with Relevance API to generate insights."""
     
@@ -24,29 +28,61 @@ class RelevanceClient:
         Returns:
             str: AI-generated insights text
         """
+        return "".join(self.stream_insights(kpi_data))
+    
+    def stream_insights(self, kpi_data):
+        """
+        Generate AI insights from campaign KPI data as they are produced.
+        
+        Suitable for st.write_stream, which renders the first words while the
+        rest of the completion is still being generated.
+        
+        Args:
+            kpi_data: pandas.DataFrame with calculated KPIs
+            
+        Yields:
+            str: Successive chunks of the AI-generated insights text
+        """
+        data_summary = None
+        streamed = False
         try:
             # Prepare data summary for the API
             data_summary = self._prepare_data_summary(kpi_data)
             
             # Print JSON data to console for debugging/reference
-            import json
-            print("=" * 50)
-            print("JSON DATA BEING SENT TO RELEVANCE API:")
-            print("=" * 50)
-            print(json.dumps(data_summary, indent=2, default=str))
-            print("=" * 50)
+            self._debug_dump(data_summary, "JSON DATA BEING SENT TO RELEVANCE API:")
             
             # Call Relevance API
-            insights = self._call_relevance_api(data_summary)
-            
-            return insights
+            for chunk in self._call_relevance_api(data_summary):
+                streamed = True
+                yield chunk
             
         except Exception as e:
             st.error(f"Error generating insights: {str(e)}")
-            return self._generate_fallback_insights(kpi_data)
+            if streamed:
+                # Part of the AI text is already out; mark it cut off rather than appending
+                # the whole fallback report to it
+                yield "\n\n*The AI response was interrupted, so the insights above are incomplete.*"
+                return
+            # Reuse the summary if it was built before the failure
+            yield self._generate_fallback_insights(kpi_data if data_summary is None else data_summary)
+    
+    def _debug_dump(self, data_summary, title):
+        """Print the summary JSON; formatting the indented dump is costly, so only with RELEVANCE_DEBUG set."""
+        if os.getenv("RELEVANCE_DEBUG"):
+            print("=" * 50)
+            print(title)
+            print("=" * 50)
+            print(json.dumps(data_summary, indent=2, default=str))
+            print("=" * 50)
     
     def _prepare_data_summary(self, df):
         """Prepare a structured summary of the data for the API."""
+        # One reduction per column group; the scalars are reused below
+        totals = df[['impressions', 'clicks']].sum()
+        means = df[['cpc', 'cpm', 'ctr']].mean()
+        total_impressions, total_clicks = int(totals['impressions']), int(totals['clicks'])
+        
         summary = {
             "campaign_overview": {
                 "total_campaigns": df['campaign_id'].nunique(),
@@ -54,46 +90,64 @@ class RelevanceClient:
                     "start": df['date'].min().strftime('%Y-%m-%d'),
                     "end": df['date'].max().strftime('%Y-%m-%d')
                 },
-                "total_spend": float(df['spend'].sum()),
-                "total_impressions": int(df['impressions'].sum()),
-                "total_clicks": int(df['clicks'].sum())
+                "total_spend": float(df['spend'].to_numpy().sum(dtype='float64')),
+                "total_impressions": total_impressions,
+                "total_clicks": total_clicks
             },
             "performance_metrics": {
-                "avg_cpc": float(df['cpc'].mean()),
-                "avg_cpm": float(df['cpm'].mean()),
-                "avg_ctr": float(df['ctr'].mean()),
-                "overall_ctr": float(df['clicks'].sum() / df['impressions'].sum()) if df['impressions'].sum() > 0 else 0
+                "avg_cpc": float(means['cpc']),
+                "avg_cpm": float(means['cpm']),
+                "avg_ctr": float(means['ctr']),
+                "overall_ctr": total_clicks / total_impressions if total_impressions > 0 else 0
             },
-            "campaign_performance": self._get_campaign_performance(df),
-            "time_trends": self._get_time_trends(df)
+            "campaign_performance": self._get_campaign_performance(self._aggregate_campaigns(df)),
+            "time_trends": self._get_time_trends(self._aggregate_days(df))
         }
         
         # Add conversion metrics if available
         if 'purchases' in df.columns:
             summary["conversion_metrics"] = {
                 "total_purchases": int(df['purchases'].sum()),
-                "avg_cpa": float(df[df['cpa'] > 0]['cpa'].mean()) if (df['cpa'] > 0).any() else 0,
+                "avg_cpa": self._positive_mean(df['cpa']),
                 "avg_cvr": float(df['cvr'].mean())
             }
         
         if 'revenue' in df.columns:
             summary["revenue_metrics"] = {
-                "total_revenue": float(df['revenue'].sum()),
-                "avg_roas": float(df[df['roas'] > 0]['roas'].mean()) if (df['roas'] > 0).any() else 0
+                "total_revenue": float(df['revenue'].to_numpy().sum(dtype='float64')),
+                "avg_roas": self._positive_mean(df['roas'])
             }
         
         return summary
     
-    def _get_campaign_performance(self, df):
-        """Get top and bottom performing campaigns."""
-        campaign_summary = df.groupby('campaign_id').agg({
-            'spend': 'sum',
-            'clicks': 'sum',
-            'impressions': 'sum',
-            'ctr': 'mean',
-            'cpc': 'mean'
-        }).reset_index()
-        
+    def _positive_mean(self, series):
+        """Mean of the positive values of a KPI column, or 0 when there are none."""
+        values = series.to_numpy()
+        positive = values[values > 0]
+        return float(positive.mean()) if positive.size else 0
+    
+    def _aggregate_campaigns(self, df):
+        """Aggregate the KPI rows once per campaign; key order is irrelevant to the rankings."""
+        return df.groupby('campaign_id', observed=True, sort=False, as_index=False).agg(
+            spend=('spend', 'sum'),
+            clicks=('clicks', 'sum'),
+            impressions=('impressions', 'sum'),
+            ctr=('ctr', 'mean'),
+            cpc=('cpc', 'mean')
+        )
+    
+    def _aggregate_days(self, df):
+        """Aggregate the KPI rows once per day, in date order."""
+        return df.groupby('date', as_index=False).agg(
+            spend=('spend', 'sum'),
+            clicks=('clicks', 'sum'),
+            impressions=('impressions', 'sum'),
+            ctr=('ctr', 'mean')
+        )
+    
+    def _get_campaign_performance(self, campaign_summary):
+        """Get top and bottom performing campaigns from the per-campaign aggregate."""
+        # nlargest/nsmallest select by partial sort, so no full sort of the campaigns is needed
         # Sort by spend to get top campaigns
         top_campaigns = campaign_summary.nlargest(5, 'spend').to_dict('records')
         
@@ -107,25 +161,24 @@ class RelevanceClient:
             "worst_ctr": worst_ctr
         }
     
-    def _get_time_trends(self, df):
-        """Get performance trends over time."""
-        daily_summary = df.groupby('date').agg({
-            'spend': 'sum',
-            'clicks': 'sum',
-            'impressions': 'sum',
-            'ctr': 'mean'
-        }).reset_index()
-        
+    def _get_time_trends(self, daily_summary):
+        """Get performance trends over time from the date-ordered daily aggregate."""
         # Calculate week-over-week changes if enough data
-        if len(daily_summary) >= 7:
-            recent_week = daily_summary.tail(7)
-            previous_week = daily_summary.iloc[-14:-7] if len(daily_summary) >= 14 else daily_summary.head(7)
+        days = len(daily_summary)
+        if days >= 7:
+            # Each week is reduced once, on slices of the column arrays
+            spend = daily_summary['spend'].to_numpy(dtype=np.float64)
+            ctr = daily_summary['ctr'].to_numpy(dtype=np.float64)
+            recent_week = slice(days - 7, days)
+            previous_week = slice(days - 14, days - 7) if days >= 14 else slice(0, 7)
             
-            wow_spend_change = ((recent_week['spend'].sum() - previous_week['spend'].sum()) / 
-                              previous_week['spend'].sum() * 100) if previous_week['spend'].sum() > 0 else 0
+            recent_spend, previous_spend = spend[recent_week].sum(), spend[previous_week].sum()
+            wow_spend_change = ((recent_spend - previous_spend) / 
+                              previous_spend * 100) if previous_spend > 0 else 0
             
-            wow_ctr_change = ((recent_week['ctr'].mean() - previous_week['ctr'].mean()) / 
-                             previous_week['ctr'].mean() * 100) if previous_week['ctr'].mean() > 0 else 0
+            recent_ctr, previous_ctr = ctr[recent_week].mean(), ctr[previous_week].mean()
+            wow_ctr_change = ((recent_ctr - previous_ctr) / 
+                             previous_ctr * 100) if previous_ctr > 0 else 0
             
             return {
                 "wow_spend_change": float(wow_spend_change),
@@ -136,7 +189,7 @@ class RelevanceClient:
         return {"trend_data": daily_summary.to_dict('records')}
     
     def _call_relevance_api(self, data_summary):
-        """Make API call to Relevance AI."""
+        """Make a streaming API call to Relevance AI, yielding the completion text in chunks."""
         headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
@@ -158,83 +211,74 @@ class RelevanceClient:
                 }
             ],
             "max_tokens": 1500,
-            "temperature": 0.7
+            "temperature": 0.7,
+            "stream": True
         }
         
         # Note: This is a simplified API call structure
         # The actual Relevance AI API structure may differ
-        response = requests.post(
+        # Compact separators keep the request body free of padding whitespace
+        with RELEVANCE_SESSION.post(
             f"{self.base_url}/completion",
             headers=headers,
-            json=payload,
-            timeout=30
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return result.get('choices', [{}])[0].get('message', {}).get('content', 'No insights generated')
-        else:
-            st.warning(f"API call failed with status {response.status_code}")
-            return self._generate_fallback_insights_from_summary(data_summary)
+            data=json.dumps(payload, separators=(',', ':')),
+            timeout=30,
+            stream=True
+        ) as response:
+            if response.status_code != 200:
+                st.warning(f"API call failed with status {response.status_code}")
+                yield self._generate_fallback_insights_from_summary(data_summary)
+                return
+            
+            # A server that ignores "stream" answers with a single JSON body
+            if not response.headers.get('Content-Type', '').startswith('text/event-stream'):
+                result = response.json()
+                yield result.get('choices', [{}])[0].get('message', {}).get('content', 'No insights generated')
+                return
+            
+            # Server-sent events: one "data: {...}" line per content delta, then "data: [DONE]";
+            # the space after the colon is optional
+            produced = False
+            for line in response.iter_lines():
+                if not line.startswith(b"data:"):
+                    continue
+                data = line[len(b"data:"):].removeprefix(b" ")
+                if data == b"[DONE]":
+                    break
+                event = json.loads(data)
+                # An error reported mid-stream ends the completion; stream_insights marks the
+                # text so far as cut off
+                if 'error' in event:
+                    raise RuntimeError(f"Relevance API error: {event['error']}")
+                content = event.get('choices', [{}])[0].get('delta', {}).get('content')
+                if content:
+                    produced = True
+                    yield content
+            
+            if not produced:
+                yield 'No insights generated'
     
     def _construct_insight_prompt(self, data_summary):
         """Construct a detailed prompt for insight generation."""
-        prompt = f"""
-        Analyze the following digital advertising campaign performance data and provide actionable insights:
-
-        CAMPAIGN OVERVIEW:
-        - Total Campaigns: {data_summary['campaign_overview']['total_campaigns']}
-        - Date Range: {data_summary['campaign_overview']['date_range']['start']} to {data_summary['campaign_overview']['date_range']['end']}
-        - Total Spend: ${data_summary['campaign_overview']['total_spend']:,.2f}
-        - Total Impressions: {data_summary['campaign_overview']['total_impressions']:,}
-        - Total Clicks: {data_summary['campaign_overview']['total_clicks']:,}
-
-        PERFORMANCE METRICS:
-        - Average CPC: ${data_summary['performance_metrics']['avg_cpc']:.2f}
-        - Average CPM: ${data_summary['performance_metrics']['avg_cpm']:.2f}
-        - Average CTR: {data_summary['performance_metrics']['avg_ctr']:.2%}
-        - Overall CTR: {data_summary['performance_metrics']['overall_ctr']:.2%}
-        """
+        # Each section is a precompiled template rendered straight from its summary dict
+        sections = [RELEVANCE_OVERVIEW_PROMPT.format(**data_summary['campaign_overview'],
+                                                     **data_summary['performance_metrics'])]
         
         if 'conversion_metrics' in data_summary:
-            prompt += f"""
-        CONVERSION METRICS:
-        - Total Purchases: {data_summary['conversion_metrics']['total_purchases']:,}
-        - Average CPA: ${data_summary['conversion_metrics']['avg_cpa']:.2f}
-        - Average CVR: {data_summary['conversion_metrics']['avg_cvr']:.2%}
-            """
+            sections.append(RELEVANCE_CONVERSION_PROMPT.format(**data_summary['conversion_metrics']))
         
         if 'revenue_metrics' in data_summary:
-            prompt += f"""
-        REVENUE METRICS:
-        - Total Revenue: ${data_summary['revenue_metrics']['total_revenue']:,.2f}
-        - Average ROAS: {data_summary['revenue_metrics']['avg_roas']:.2f}x
-            """
-        
-        prompt += """
-        
-        Please provide:
-        1. Key Performance Insights (3-4 bullet points)
-        2. Areas of Concern (if any)
-        3. Optimization Recommendations (3-5 actionable suggestions)
-        4. Budget Allocation Suggestions
-        5. Overall Campaign Health Assessment
-        
-        Focus on practical, data-driven recommendations that can improve campaign performance.
-        """
+            sections.append(RELEVANCE_REVENUE_PROMPT.format(**data_summary['revenue_metrics']))
+        
+        sections.append(RELEVANCE_REQUEST_PROMPT)
         
-        return prompt
+        return "".join(sections)
     
-    def _generate_fallback_insights(self, df):
-        """Generate basic insights when API is unavailable."""
+    def _generate_fallback_insights(self, data):
+        """Generate basic insights when API is unavailable, from KPI data or an already-built summary."""
+        data_summary = data if isinstance(data, dict) else self._prepare_data_summary(data)
         # Still print the JSON data even when using fallback
-        data_summary = self._prepare_data_summary(df)
-        import json
-        print("=" * 50)
-        print("JSON DATA THAT WOULD BE SENT TO RELEVANCE API (using fallback):")
-        print("=" * 50)
-        print(json.dumps(data_summary, indent=2, default=str))
-        print("=" * 50)
+        self._debug_dump(data_summary, "JSON DATA THAT WOULD BE SENT TO RELEVANCE API (using fallback):")
         
         return self._generate_fallback_insights_from_summary(data_summary)
     
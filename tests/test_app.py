@@ -0,0 +1,91 @@
+from pathlib import Path
+
+import pandas as pd
+import streamlit as st
+
+import app
+from data_processor import DataProcessor
+
+SAMPLE_WORKBOOK = next((Path(__file__).parent.parent / 'attached_assets').glob('*.xlsx'))
+
+
+def _clean_sample():
+    processor = DataProcessor()
+    return processor.clean_and_normalize(processor.load_excel_data(SAMPLE_WORKBOOK))
+
+
+def test_processed_data_is_the_cleaned_frame_after_the_kpi_step():
+    for key in ('processed_data', 'kpis', 'insights'):
+        st.session_state[key] = None
+
+    app.process_kpis_and_insights(_clean_sample(), None)
+
+    # The KPI step overwrites frequency with its proxy; the preview must keep the upload's values
+    pd.testing.assert_frame_equal(st.session_state.processed_data, _clean_sample())
+    assert not st.session_state.kpis['frequency'].equals(st.session_state.processed_data['frequency'])
+
+
+class _FakeMetaClient:
+    """Answers from a scripted list of results, counting the underlying API calls."""
+
+    def __init__(self, insights=(), bootstraps=()):
+        self.insights = list(insights)
+        self.bootstraps = list(bootstraps)
+        self.calls = 0
+
+    def get_insights_data(self, account_id, date_range):
+        self.calls += 1
+        return self.insights.pop(0)
+
+    def bootstrap(self):
+        self.calls += 1
+        return self.bootstraps.pop(0)
+
+
+def test_insights_cache_skips_incomplete_fetches():
+    app._get_insights_cached.clear()
+    partial = pd.DataFrame({'spend': [1.0]})
+    complete = pd.DataFrame({'spend': [1.0, 2.0]})
+    client = _FakeMetaClient(insights=[(partial, False), (complete, True)])
+
+    args = (client, 'act_1', '2025-07-29', '2025-08-27', 'token-hash')
+    pd.testing.assert_frame_equal(app._get_insights(*args), partial)
+    pd.testing.assert_frame_equal(app._get_insights(*args), complete)
+    pd.testing.assert_frame_equal(app._get_insights(*args), complete)
+    assert client.calls == 2
+
+
+def test_validation_cache_replays_both_outcomes(monkeypatch):
+    app._validate_excel_cached.clear()
+    calls = []
+
+    class FakeValidator:
+        def validate_excel_file(self, uploaded_file):
+            content = uploaded_file.read()
+            calls.append(content)
+            return content == b'good', 'message'
+
+    monkeypatch.setattr(app, 'ExcelValidator', FakeValidator)
+
+    # A verdict depends only on the file content, so failures are cached as well
+    for _ in range(2):
+        assert app._validate_excel_cached(b'bad') == (False, 'message')
+        assert app._validate_excel_cached(b'good') == (True, 'message')
+    assert calls == [b'bad', b'good']
+
+
+def test_bootstrap_cache_skips_failed_validations():
+    app._bootstrap_cached.clear()
+    accounts = [{'id': 'act_1', 'name': 'Account'}]
+    client = _FakeMetaClient(bootstraps=[
+        (False, 'Error validating token: timed out', []),
+        (True, 'Token valid for user: Someone', []),
+        (True, 'Token valid for user: Someone', accounts),
+    ])
+
+    assert app._bootstrap(client, 'token-hash')[0] is False
+    # A valid token whose account list failed is retried as well
+    assert app._bootstrap(client, 'token-hash')[2] == []
+    assert app._bootstrap(client, 'token-hash')[2] == accounts
+    assert app._bootstrap(client, 'token-hash')[2] == accounts
+    assert client.calls == 3
@@ -0,0 +1,73 @@
+from io import BytesIO
+
+import pandas as pd
+
+from data_processor import DataProcessor
+from kpi_calculator import KPICalculator
+
+
+def _workbook(df):
+    buffer = BytesIO()
+    df.to_excel(buffer, index=False)
+    buffer.seek(0)
+    return buffer
+
+
+def test_standard_schema_upload_keeps_every_column():
+    upload = pd.DataFrame({
+        'Campaign Name': ['Summer Sale', 'Winter Sale'],
+        'Reporting starts': ['2025-07-29', '2025-07-30'],
+        'Amount spent (INR)': [20.0, 10.0],
+        'Impressions': [1000, 500],
+        'Link clicks': [40, 20],
+        'purchases': [2, 1],
+        'revenue': [100.0, 50.0],
+        'account_id': ['act_1', 'act_1'],
+        'campaign_id': ['c1', 'c2'],
+        'ad_id': ['a1', 'a2'],
+        'creative_id': ['cr1', 'cr2'],
+        'objective': ['OUTCOME_SALES', 'OUTCOME_SALES'],
+        'Notes': ['launch', 'promo'],
+    })
+    processor = DataProcessor()
+
+    raw = processor.load_excel_data(_workbook(upload))
+    assert list(raw.columns) == list(upload.columns)
+
+    processed = processor.clean_and_normalize(raw)
+    assert processed['revenue'].tolist() == [100.0, 50.0]
+    assert processed['purchases'].tolist() == [2, 1]
+    assert processed['account_id'].astype(str).tolist() == ['act_1', 'act_1']
+    assert processed['campaign_id'].astype(str).tolist() == ['c1', 'c2']
+    assert processed['ad_id'].astype(str).tolist() == ['a1', 'a2']
+    assert processed['creative_id'].astype(str).tolist() == ['cr1', 'cr2']
+    assert processed['objective'].astype(str).tolist() == ['OUTCOME_SALES', 'OUTCOME_SALES']
+    assert processed['notes'].tolist() == ['launch', 'promo']
+
+    kpis = KPICalculator().calculate_all_kpis(processed)
+    assert kpis['roas'].tolist() == [5.0, 5.0]
+
+
+def test_drop_incomplete_and_duplicate_rows_matches_pandas(monkeypatch):
+    warnings = []
+    monkeypatch.setattr('data_processor.st.warning', warnings.append)
+    nat = pd.NaT
+    df = pd.DataFrame({
+        'date': pd.to_datetime(['2025-07-30', '2025-07-29', '2025-07-29', nat, '2025-07-29',
+                                '2025-07-30', '2025-07-29', '2025-07-29', '2025-07-29', '2025-07-30']),
+        # Unused categories leave gaps in the codes
+        'campaign_name': pd.Categorical(['B', 'A', 'A', 'A', None, 'B', 'A', 'C', 'A', 'B'],
+                                        categories=['A', 'Unused', 'B', 'C', 'Z']),
+        'ad_id': pd.Categorical(['x', 'y', 'x', 'x', 'x', 'x', None, 'x', None, None],
+                                categories=['w', 'x', 'y']),
+        'spend': [float(i) for i in range(10)],
+    })
+
+    result = DataProcessor()._drop_incomplete_and_duplicate_rows(df)
+
+    complete = df.dropna(subset=['campaign_name', 'date'])
+    deduplicated = complete.drop_duplicates(subset=['date', 'campaign_name', 'ad_id'], keep='first')
+    expected = deduplicated.sort_values(['date', 'campaign_name'], kind='stable')
+
+    pd.testing.assert_frame_equal(result, expected)
+    assert warnings == [f"Removed {len(complete) - len(deduplicated)} duplicate rows"]
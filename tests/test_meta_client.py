@@ -0,0 +1,72 @@
+import pandas as pd
+
+from meta_client import MetaAdsClient
+
+
+class _FakeResponse:
+    status_code = 200
+    text = ''
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def json(self):
+        return self.payload
+
+
+class _FakeSession:
+    """Replays scripted insights pages, recording each request's URL and params."""
+
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.requests = []
+
+    def get(self, url, params=None, timeout=None):
+        self.requests.append((url, dict(params or {})))
+        return _FakeResponse(self.pages.pop(0))
+
+
+def _page(ad_id, paging):
+    return {'data': [{'ad_id': ad_id}], 'paging': paging}
+
+
+def test_insights_window_keeps_following_next_urls_after_a_cursorless_page():
+    next_url = 'https://graph.facebook.com/v18.0/act_1/insights?after=c2&limit=500'
+    session = _FakeSession([
+        _page('1', {'cursors': {'after': 'c1'}, 'next': 'https://graph.facebook.com/next-1'}),
+        _page('2', {'next': next_url}),
+        _page('3', {'cursors': {'after': 'c3'}, 'next': 'https://graph.facebook.com/next-3'}),
+        _page('4', {}),
+    ])
+    client = MetaAdsClient('token')
+    client.session = session
+
+    columns, error = client._fetch_insights_window('base-url', {'limit': 500},
+                                                   ('2025-07-29', '2025-08-04'), ['ad_id'])
+
+    assert error is None
+    assert columns == {'ad_id': ['1', '2', '3', '4']}
+    urls = [url for url, _ in session.requests]
+    assert urls == ['base-url', 'base-url', next_url, 'https://graph.facebook.com/next-3']
+    assert session.requests[1][1]['after'] == 'c1'
+    # Next URLs carry their own query string, so no params (and no second after=) are added
+    assert session.requests[2][1] == {} and session.requests[3][1] == {}
+
+
+def test_process_insights_data_extracts_purchase_actions():
+    purchase = {'action_type': 'purchase', 'value': '2'}
+    df = pd.DataFrame({
+        'date_start': ['2025-07-29'] * 5,
+        'spend': ['10.5', None, '1', '2', '3'],
+        'actions': [[{'action_type': 'link_click', 'value': '9'}, purchase], None, [],
+                    '[{"action_type": "purchase", "value": "3"}]', [{'action_type': 'purchase'}]],
+        'action_values': [[{'action_type': 'purchase', 'value': '19.99'}], float('nan'),
+                          [{'action_type': 'link_click', 'value': '1'}], 'not json', [purchase]],
+    })
+
+    result = MetaAdsClient('token')._process_insights_data(df, 'act_1')
+
+    assert result['purchases'].tolist() == [2.0, 0.0, 0.0, 3.0, 0.0]
+    assert result['revenue'].tolist() == [19.99, 0.0, 0.0, 0.0, 2.0]
+    assert result['spend'].tolist() == [10.5, 0.0, 1.0, 2.0, 3.0]
+    assert result['account_id'].tolist() == ['act_1'] * 5
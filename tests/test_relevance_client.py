@@ -0,0 +1,81 @@
+import json
+
+import pytest
+
+import relevance_client
+from relevance_client import RelevanceClient
+
+
+class _FakeStreamResponse:
+    """Context-managed stand-in for a streamed requests response."""
+
+    status_code = 200
+    headers = {'Content-Type': 'text/event-stream'}
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def iter_lines(self):
+        return iter(self.lines)
+
+
+def _delta(content):
+    return json.dumps({'choices': [{'delta': {'content': content}}]}).encode()
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = RelevanceClient(api_key='test-key')
+    monkeypatch.setattr(client, '_construct_insight_prompt', lambda data_summary: 'prompt')
+    return client
+
+
+def _stream(monkeypatch, client, lines):
+    monkeypatch.setattr(relevance_client.RELEVANCE_SESSION, 'post',
+                        lambda *args, **kwargs: _FakeStreamResponse(lines))
+    return list(client._call_relevance_api({}))
+
+
+def test_stream_joins_deltas_with_and_without_space_after_data(monkeypatch, client):
+    lines = [
+        b': keep-alive',
+        b'event: message',
+        b'data: ' + _delta('Split '),
+        b'',
+        b'data:' + _delta('across '),
+        b'data: ' + json.dumps({'choices': [{'delta': {}}]}).encode(),
+        b'data:' + _delta('chunks'),
+        b'data: [DONE]',
+        b'data: ' + _delta('after the end'),
+    ]
+
+    assert _stream(monkeypatch, client, lines) == ['Split ', 'across ', 'chunks']
+
+
+def test_stream_without_content_reports_no_insights(monkeypatch, client):
+    assert _stream(monkeypatch, client, [b'data:[DONE]']) == ['No insights generated']
+
+
+def test_error_payload_mid_stream_raises(monkeypatch, client):
+    lines = [b'data: ' + _delta('Partial'), b'data: {"error": {"message": "overloaded"}}']
+
+    with pytest.raises(RuntimeError, match='overloaded'):
+        _stream(monkeypatch, client, lines)
+
+
+def test_broken_stream_ends_with_truncation_notice(monkeypatch, client):
+    monkeypatch.setattr(client, '_prepare_data_summary', lambda kpi_data: {})
+    monkeypatch.setattr(relevance_client.RELEVANCE_SESSION, 'post',
+                        lambda *args, **kwargs: _FakeStreamResponse([b'data: ' + _delta('Partial'),
+                                                                     b'data: {not json']))
+
+    chunks = list(client.stream_insights(None))
+
+    assert chunks[0] == 'Partial'
+    assert len(chunks) == 2 and 'interrupted' in chunks[1]
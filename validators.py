@@ -14,6 +14,20 @@ class ExcelValidator:
         'Link clicks'
     ]
     
+    # Normalized (lowercased) names, computed once for every validation: the tuple keeps the
+    # declared order for messages, the set takes one difference against the normalized header
+    REQUIRED_LOWER = tuple(col.lower() for col in REQUIRED_COLUMNS)
+    REQUIRED_SET = frozenset(REQUIRED_LOWER)
+    
+    # Metrics that can never be negative
+    NON_NEGATIVE_COLUMNS = ('amount spent (inr)', 'impressions', 'link clicks')
+    
+    # Rows sharing these (normalized) columns are the duplicates DataProcessor drops
+    DUPLICATE_KEY_COLUMNS = ('reporting starts', 'campaign name', 'ad_id')
+    
+    # Date cells pandas parses to NaT without error, so they are not invalid dates
+    NAT_STRINGS = ('', 'NaT', 'nat', 'NAT', 'nan', 'NaN', 'NAN')
+    
     OPTIONAL_COLUMNS = [
         'Results',
         'Result indicator',
@@ -47,11 +61,24 @@ class ExcelValidator:
             tuple: (is_valid: bool, message: str)
         """
         try:
-            self.errors = []
-            self.warnings = []
+            # Reset the results of any previous validation in place
+            self.errors.clear()
+            self.warnings.clear()
+            
+            # Read Excel file with the Rust calamine parser into Arrow-backed columns: nulls
+            # live in validity bitmaps, so integer columns with gaps stay integers and text
+            # is stored as contiguous Arrow strings instead of Python objects
+            try:
+                df = pd.read_excel(uploaded_file, sheet_name=0, engine='calamine',
+                                   dtype_backend='pyarrow')
+            except ImportError:
+                # python-calamine not installed; fall back to pandas' default reader
+                uploaded_file.seek(0)
+                df = pd.read_excel(uploaded_file, sheet_name=0, dtype_backend='pyarrow')
             
-            # Read Excel file
-            df = pd.read_excel(uploaded_file, sheet_name=0)
+            # Normalize column names once, in place; the checks below only read the frame,
+            # so no normalized copy is needed
+            df.columns = [col.lower().strip() for col in df.columns]
             
             # Validate basic structure
             if not self._validate_structure(df):
@@ -61,12 +88,15 @@ class ExcelValidator:
             if not self._validate_columns(df):
                 return False, "; ".join(self.errors)
             
+            # One missing-value mask serves both the empty-row and the missing-share checks
+            missing = df.isna().to_numpy()
+            
             # Validate data types and content
-            if not self._validate_data_content(df):
+            if not self._validate_data_content(df, missing):
                 return False, "; ".join(self.errors)
             
             # Check for warnings
-            self._check_warnings(df)
+            self._check_warnings(df, missing)
             
             message = "Validation successful"
             if self.warnings:
@@ -91,91 +121,98 @@ class ExcelValidator:
     
     def _validate_columns(self, df):
         """Validate required columns are present."""
-        df_columns = [col.lower().strip() for col in df.columns]
-        missing_columns = []
-        
-        for required_col in self.REQUIRED_COLUMNS:
-            if required_col.lower() not in df_columns:
-                missing_columns.append(required_col)
+        missing = self.REQUIRED_SET.difference(df.columns)
         
-        if missing_columns:
+        if missing:
+            # Report them under their declared names and in their declared order
+            missing_columns = [col for col, lower in zip(self.REQUIRED_COLUMNS, self.REQUIRED_LOWER) if lower in missing]
             self.errors.append(f"Missing required columns: {', '.join(missing_columns)}")
             return False
         
         return True
     
-    def _validate_data_content(self, df):
-        """Validate data content and types."""
-        # Normalize column names for validation
-        df_norm = df.copy()
-        df_norm.columns = [col.lower().strip() for col in df_norm.columns]
+    def _validate_data_content(self, df, missing):
+        """Validate data content and types; `missing` is the frame's isna mask as an array."""
+        # Column membership is probed repeatedly below, so the header is hashed once
+        present = frozenset(df.columns)
         
         # Check for completely empty rows
-        empty_rows = df_norm.isnull().all(axis=1).sum()
+        empty_rows = np.count_nonzero(missing.all(axis=1))
         if empty_rows > 0:
             self.warnings.append(f"{empty_rows} completely empty rows found")
         
-        # Validate numeric columns (using the new column names)
-        numeric_columns = ['amount spent (inr)', 'impressions', 'link clicks']
-        if 'results' in df_norm.columns:
-            numeric_columns.append('results')
-        if 'reach' in df_norm.columns:
-            numeric_columns.append('reach')
-        
-        for col in numeric_columns:
-            if col in df_norm.columns:
-                if not pd.api.types.is_numeric_dtype(df_norm[col]):
-                    # Try to convert to numeric
-                    df_norm[col] = pd.to_numeric(df_norm[col], errors='coerce')
-                
-                # Check for negative values where they shouldn't be
-                if col in ['amount spent (inr)', 'impressions', 'link clicks'] and (df_norm[col] < 0).any():
-                    self.errors.append(f"Negative values found in {col} column")
-                    return False
+        # Check for negative values where they shouldn't be (using the new column names)
+        for col in self.NON_NEGATIVE_COLUMNS:
+            if col in present and (self._numeric_values(df[col], dtype=None) < 0).any():
+                self.errors.append(f"Negative values found in {col} column")
+                return False
         
         # Validate date column
-        if 'reporting starts' in df_norm.columns:
-            try:
-                pd.to_datetime(df_norm['reporting starts'], errors='raise')
-            except:
-                self.errors.append("Reporting starts column contains invalid date formats")
-                return False
+        if 'reporting starts' in present:
+            # A column Excel already stores as dates (timestamp dtype) needs no parsing
+            dates = df['reporting starts']
+            if dates.dtype.kind != 'M':
+                # Unparseable values become NaT instead of raising, so an invalid file costs no
+                # exception; the format is still inferred once and applied to the whole column
+                parsed = pd.to_datetime(dates, errors='coerce', cache=True)
+                if (parsed.isna() & dates.notna() & ~dates.isin(self.NAT_STRINGS)).any():
+                    self.errors.append("Reporting starts column contains invalid date formats")
+                    return False
         
         # Validate campaign name is not empty (our main identifier)
-        if 'campaign name' in df_norm.columns:
-            if df_norm['campaign name'].isnull().any():
+        if 'campaign name' in present:
+            if df['campaign name'].isnull().any():
                 self.errors.append("Campaign name column contains empty values")
                 return False
         
         return True
     
-    def _check_warnings(self, df):
-        """Check for potential data quality issues."""
-        df_norm = df.copy()
-        df_norm.columns = [col.lower().strip() for col in df_norm.columns]
-        
-        # Check for high percentage of missing values
-        for col in df_norm.columns:
-            missing_pct = df_norm[col].isnull().mean()
-            if missing_pct > 0.1:  # More than 10% missing
-                self.warnings.append(f"{col} has {missing_pct:.1%} missing values")
-        
-        # Check for duplicate rows
-        duplicate_count = df_norm.duplicated().sum()
+    def _check_warnings(self, df, missing):
+        """Check for potential data quality issues; `missing` is the frame's isna mask as an array."""
+        # Check for high percentage of missing values, for every column in one reduction
+        missing_pct = pd.Series(missing.mean(axis=0), index=df.columns)
+        high_missing = missing_pct[missing_pct > 0.1]  # More than 10% missing
+        self.warnings.extend(f"{col} has {pct:.1%} missing values" for col, pct in high_missing.items())
+        
+        # Check for duplicate rows, hashing only the key columns rather than every cell of each row
+        key_columns = [col for col in self.DUPLICATE_KEY_COLUMNS if col in df.columns]
+        duplicate_count = df.duplicated(subset=key_columns).sum()
         if duplicate_count > 0:
             self.warnings.append(f"{duplicate_count} duplicate rows found")
         
-        # Check for unrealistic values
-        if 'amount spent (inr)' in df_norm.columns and 'link clicks' in df_norm.columns:
+        # Check for unrealistic values on float64 arrays pulled once per column and shared by
+        # both ratio checks; ratios stay local arrays, never columns of the frame
+        metrics = {col: self._numeric_values(df[col]) for col in self.NON_NEGATIVE_COLUMNS if col in df.columns}
+        clicks = metrics.get('link clicks')
+        
+        # Ratios divide only where the denominator is non-zero, in one numpy kernel each;
+        # the other slots stay NaN and never pass a threshold
+        if clicks is not None and 'amount spent (inr)' in metrics:
             # Check for very high CPC (might indicate data quality issues)
-            df_norm['temp_cpc'] = df_norm['amount spent (inr)'] / df_norm['link clicks'].replace(0, np.nan)
-            high_cpc_count = (df_norm['temp_cpc'] > 1000).sum()  # Adjusted for INR
+            cpc = np.divide(metrics['amount spent (inr)'], clicks,
+                            out=np.full_like(clicks, np.nan), where=clicks != 0)
+            high_cpc_count = np.count_nonzero(cpc > 1000)  # Adjusted for INR
             if high_cpc_count > 0:
                 self.warnings.append(f"{high_cpc_count} records with CPC > ₹1000 (potential data quality issue)")
         
-        if 'impressions' in df_norm.columns and 'link clicks' in df_norm.columns:
+        if clicks is not None and 'impressions' in metrics:
             # Check for CTR > 100% (impossible)
-            df_norm['temp_ctr'] = df_norm['link clicks'] / df_norm['impressions'].replace(0, np.nan)
-            impossible_ctr = (df_norm['temp_ctr'] > 1).sum()
+            impressions = metrics['impressions']
+            ctr = np.divide(clicks, impressions, out=np.full_like(impressions, np.nan), where=impressions != 0)
+            impossible_ctr = np.count_nonzero(ctr > 1)
             if impossible_ctr > 0:
                 self.errors.append(f"{impossible_ctr} records with link clicks > impressions (impossible)")
+    
+    def _numeric_values(self, series, dtype=np.float64):
+        """
+        Column values as a numpy array; text that is not a number counts as missing.
+        
+        Only text columns are coerced with pd.to_numeric; numeric columns are read
+        straight from their buffer, without a copy when `dtype` is None and the column
+        has no nulls.
+        """
+        if not pd.api.types.is_numeric_dtype(series):
+            series = pd.to_numeric(series, errors='coerce')
+        if dtype is None:
+            return series.to_numpy()
+        return series.to_numpy(dtype=dtype, na_value=np.nan)